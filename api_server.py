@@ -1,7 +1,13 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from steam_manager import SteamAccountManager
+from server import init_app, serve
+from functools import wraps
+import diagnostics
+import hmac
 import logging
+import math
+import os
 
 # Настройка логирования
 logging.basicConfig(
@@ -11,27 +17,34 @@ logging.basicConfig(
 
 app = Flask(__name__)
 CORS(app)
-manager = SteamAccountManager()
+# Расписание загружается в фоне после запуска сервера (см. server.init_app / serve)
+# STEAM_DB_SHARDS > 1 включает хранение аккаунтов в нескольких файлах БД
+manager = SteamAccountManager(
+    autostart_scheduler=False, shards=int(os.environ.get('STEAM_DB_SHARDS', 1))
+)
+
+# Диагностика доступна только с заголовком X-Admin-Token; без STEAM_ADMIN_TOKEN выключена
+ADMIN_TOKEN = os.environ.get('STEAM_ADMIN_TOKEN')
+
+def admin_required(view):
+    """Доступ только для администратора"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = request.headers.get('X-Admin-Token', '')
+        if not ADMIN_TOKEN or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+            return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+init_app(app, manager)
 
 @app.route('/api/accounts', methods=['GET'])
 def get_accounts():
     """Получить список всех аккаунтов"""
     try:
-        accounts = manager.get_accounts()
-        # Не возвращаем пароли в ответе
-        safe_accounts = []
-        for acc in accounts:
-            safe_accounts.append({
-                'id': acc['id'],
-                'login': acc['login'],
-                'nickname': acc['nickname'],
-                'auto_change_enabled': acc['auto_change_enabled'],
-                'change_interval_hours': acc['change_interval_hours'],
-                'last_password_change': acc['last_password_change'],
-                'next_scheduled_change': acc['next_scheduled_change'],
-                'time_remaining_seconds': acc['time_remaining_seconds']
-            })
-        return jsonify({'success': True, 'accounts': safe_accounts})
+        # Пароли не расшифровываются и не попадают в ответ. Ответ собирается
+        # целиком до отправки, чтобы ошибка БД не обрывала JSON на середине
+        return Response(manager.get_accounts_json(), mimetype='application/json')
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -99,10 +112,48 @@ def delete_account(account_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    """Проверка работы сервера"""
-    return jsonify({'status': 'ok', 'timestamp': datetime.now().isoformat()})
+@app.route('/api/admin/health', methods=['GET'])
+@admin_required
+def admin_health():
+    """Подробная проверка: БД, задержка планировщика, потоки"""
+    try:
+        return jsonify(diagnostics.health_report(manager))
+    except Exception as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+@app.route('/api/admin/threads', methods=['GET'])
+@admin_required
+def admin_threads():
+    """Стеки всех потоков"""
+    return jsonify({'success': True, 'threads': diagnostics.thread_dump()})
+
+@app.route('/api/admin/profile', methods=['GET'])
+@admin_required
+def admin_profile():
+    """Сэмплирующий профиль процесса (?seconds=10&format=collapsed|pstats)"""
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        if not math.isfinite(seconds):
+            return jsonify({'success': False, 'error': 'seconds: нужно конечное число'}), 400
+        output_format = request.args.get('format', 'collapsed')
+        if output_format not in ('collapsed', 'pstats'):
+            return jsonify({'success': False, 'error': 'format: collapsed или pstats'}), 400
+        
+        profile = diagnostics.sample_profile(seconds)
+        if output_format == 'pstats':
+            return Response(
+                profile.to_pstats(), mimetype='application/octet-stream',
+                headers={'Content-Disposition': 'attachment; filename=profile.pstats'}
+            )
+        return Response(
+            profile.to_collapsed(), mimetype='text/plain',
+            headers={'Content-Disposition': 'attachment; filename=profile.collapsed'}
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except RuntimeError as e:
+        # Профилирование уже идет
+        return jsonify({'success': False, 'error': str(e)}), 409
 
 if __name__ == '__main__':
     print("🚀 Запуск Steam Account Manager API...")
@@ -114,5 +165,8 @@ if __name__ == '__main__':
     print("   POST /api/accounts/<id>/password - сменить пароль")
     print("   POST /api/accounts/<id>/auto-change - автосмена пароля")
     print("   DELETE /api/accounts/<id> - удалить аккаунт")
+    print("   GET  /api/health - проверка работы")
+    print("   GET  /api/ready - готовность планировщика")
+    print("   GET  /api/admin/health|threads|profile - диагностика (X-Admin-Token)")
     
-    app.run(host='0.0.0.0', port=5001, debug=False)
+    serve(app, manager)
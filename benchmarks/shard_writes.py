@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Пропускная способность записи в зависимости от числа шардов
+
+Пример: python benchmarks/shard_writes.py --shards 1 2 4 8 --threads 16
+
+Потоки одновременно выполняют запись, как при импорте и сменах паролей:
+add_account, _commit_rotation (UPDATE пароля + журнал) и
+set_auto_password_change (выключение, без таймеров).
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from steam_manager import SteamAccountManager
+
+
+class PlainCipher:
+    """Без шифрования: замеряем только запись в БД"""
+
+    def encrypt(self, data: bytes) -> bytes:
+        return data
+
+    def decrypt(self, data) -> bytes:
+        return data if isinstance(data, bytes) else data.encode()
+
+
+def run(shards: int, threads: int, ops_per_thread: int) -> tuple:
+    with tempfile.TemporaryDirectory() as workdir:
+        manager = SteamAccountManager(
+            os.path.join(workdir, 'steam_accounts.db'), autostart_scheduler=False, shards=shards
+        )
+        manager._cipher = PlainCipher()
+        failures = [0]
+        barrier = threading.Barrier(threads + 1)
+
+        def writer(n: int):
+            barrier.wait()
+            for i in range(ops_per_thread):
+                login = f'user{n}_{i}'
+                if not manager.add_account(login, 'secret', {'shared_secret': 'x'}):
+                    failures[0] += 1
+                    continue
+                conn = sqlite3.connect(manager._db_for_login(login))
+                account_id = conn.execute('SELECT id FROM accounts WHERE login = ?', (login,)).fetchone()[0]
+                conn.close()
+                try:
+                    manager._commit_rotation(account_id, b'new-secret')
+                except Exception:
+                    failures[0] += 1
+                if not manager.set_auto_password_change(account_id, False, 24):
+                    failures[0] += 1
+
+        workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+    writes = threads * ops_per_thread * 3
+    return writes / elapsed, failures[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запись при разном числе шардов")
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=50, help="аккаунтов на поток")
+    args = parser.parse_args()
+
+    print(f"Потоков: {args.threads}, операций записи: {args.threads * args.ops * 3}")
+    for shards in args.shards:
+        throughput, failures = run(shards, args.threads, args.ops)
+        print(f"  шардов {shards}: {throughput:8.0f} записей/с, ошибок {failures}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Замер времени запуска API сервера с N аккаунтами с автосменой пароля
+
+Пример: python benchmarks/startup.py --accounts 10000
+        python benchmarks/startup.py --tree /path/to/old/checkout  - сравнить с другой версией
+
+Измеряется:
+  import    - время `import api_server`
+  bound     - от запуска процесса до открытия порта
+  ready     - от запуска процесса до ответа 200 на /api/ready
+              (если эндпоинта нет - до первого ответа сервера)
+"""
+import argparse
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 5001
+
+
+def seed_database(path: str, count: int):
+    """База с count аккаунтами, у которых смена пароля запланирована в будущем"""
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS accounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            login TEXT UNIQUE NOT NULL,
+            encrypted_password TEXT NOT NULL,
+            encrypted_mafile TEXT NOT NULL,
+            nickname TEXT,
+            auto_change_enabled BOOLEAN DEFAULT 0,
+            change_interval_hours INTEGER DEFAULT 24,
+            last_password_change TIMESTAMP,
+            next_scheduled_change TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    now = datetime.now()
+    conn.executemany(
+        '''INSERT INTO accounts (login, encrypted_password, encrypted_mafile, nickname,
+                                 auto_change_enabled, change_interval_hours,
+                                 last_password_change, next_scheduled_change)
+           VALUES (?, 'x', 'x', ?, 1, 24, ?, ?)''',
+        (
+            (f'user{i}', f'user{i}', now.isoformat(),
+             (now + timedelta(hours=1, seconds=i)).isoformat())
+            for i in range(count)
+        )
+    )
+    conn.commit()
+    conn.close()
+
+
+def measure_import(tree: str, workdir: str) -> float:
+    code = (
+        "import time; start = time.perf_counter(); import api_server; "
+        "print(time.perf_counter() - start)"
+    )
+    # os._exit: не ждем завершения потоков таймеров
+    code += "; import os, sys; sys.stdout.flush(); os._exit(0)"
+    out = subprocess.run(
+        [sys.executable, '-c', code], cwd=workdir, env=_env(tree),
+        capture_output=True, text=True, check=True
+    ).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def measure_server(tree: str, workdir: str, timeout: float = 300) -> tuple:
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(tree, 'api_server.py')], cwd=workdir, env=_env(tree),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    bound = ready = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if bound is None:
+                try:
+                    socket.create_connection(('127.0.0.1', PORT), timeout=0.5).close()
+                    bound = time.perf_counter() - start
+                except OSError:
+                    time.sleep(0.005)
+                    continue
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{PORT}/api/ready', timeout=5)
+                ready = time.perf_counter() - start
+                break
+            except urllib.error.HTTPError as e:
+                if e.code == 404:
+                    # Старая версия без /api/ready: сервер отвечает - значит готов
+                    ready = time.perf_counter() - start
+                    break
+            except OSError:
+                pass
+            time.sleep(0.005)
+    finally:
+        proc.kill()
+        proc.wait()
+    return bound, ready
+
+
+def _env(tree: str) -> dict:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = tree
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер времени запуска API сервера")
+    parser.add_argument('--accounts', type=int, default=10000, help="число аккаунтов с автосменой")
+    parser.add_argument('--tree', default=ROOT, help="каталог с api_server.py (по умолчанию текущий)")
+    parser.add_argument('--runs', type=int, default=3, help="число повторов")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        seed_database(os.path.join(workdir, 'steam_accounts.db'), args.accounts)
+        print(f"Аккаунтов: {args.accounts}, версия: {args.tree}")
+        for run in range(args.runs):
+            imported = measure_import(args.tree, workdir)
+            bound, ready = measure_server(args.tree, workdir)
+            print(f"  #{run + 1}: import {imported:.3f} с, порт открыт {bound:.3f} с, готов {ready:.3f} с")
+
+
+if __name__ == '__main__':
+    main()
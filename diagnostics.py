@@ -0,0 +1,152 @@
+"""Диагностика работающего менеджера: health check, дампы потоков, профилирование.
+
+Ничего не делает, пока не вызвано: профилировщик сэмплирует стеки потоков
+только на время запроса, в остальное время накладных расходов нет.
+"""
+import marshal
+import math
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime
+
+MAX_PROFILE_SECONDS = 60
+
+_profile_lock = threading.Lock()
+
+
+def health_report(manager) -> dict:
+    """Подробная проверка состояния менеджера"""
+    databases = []
+    for path in manager.shard_paths:
+        conn = sqlite3.connect(path)
+        # Задержка - только тривиальный запрос, без сканирования таблиц
+        start = time.perf_counter()
+        conn.execute('SELECT 1').fetchone()
+        latency = time.perf_counter() - start
+        pending = conn.execute('SELECT COUNT(*) FROM rotation_journal').fetchone()[0]
+        conn.close()
+        databases.append({
+            'path': path,
+            'latency_ms': round(latency * 1000, 3),
+            'pending_rotations': pending
+        })
+
+    lags = list(manager.scheduler_lag)
+    return {
+        'status': 'ok',
+        'timestamp': datetime.now().isoformat(),
+        'ready': manager.ready.is_set(),
+        'databases': databases,
+        'scheduler': {
+            'timers': len(manager.timers),
+            'lag_samples': len(lags),
+            'lag_avg_seconds': round(sum(lags) / len(lags), 3) if lags else None,
+            'lag_max_seconds': round(max(lags), 3) if lags else None
+        },
+        'threads': threading.active_count(),
+        'caches': {
+            'scheduler_lag': len(lags),
+            'in_flight': len(manager._flights),
+            'cipher_loaded': manager._cipher is not None
+        }
+    }
+
+
+def thread_dump() -> list:
+    """Стеки всех потоков процесса"""
+    frames = sys._current_frames()
+    threads = []
+    for thread in threading.enumerate():
+        frame = frames.get(thread.ident)
+        threads.append({
+            'name': thread.name,
+            'ident': thread.ident,
+            'daemon': thread.daemon,
+            'stack': traceback.format_stack(frame) if frame else []
+        })
+    return threads
+
+
+class SampleProfile:
+    """Результат сэмплирующего профилирования"""
+
+    def __init__(self, samples: Counter, interval: float):
+        # (имя потока, стек от корня к листу) -> число сэмплов
+        self.samples = samples
+        # Фактический период сэмплирования (сек): пауза плюс время самого прохода
+        self.interval = interval
+
+    def to_collapsed(self) -> str:
+        """Свернутые стеки (формат flamegraph.pl / speedscope)"""
+        lines = []
+        for (thread_name, stack), count in self.samples.items():
+            frames = [thread_name] + [f"{name} ({filename}:{lineno})" for filename, lineno, name in stack]
+            lines.append(f"{';'.join(frames)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def to_pstats(self) -> bytes:
+        """Данные в формате marshal для pstats.Stats / snakeviz"""
+        stats = {}
+
+        def entry(func):
+            if func not in stats:
+                stats[func] = [0, 0, 0.0, 0.0, {}]
+            return stats[func]
+
+        for (_, stack), count in self.samples.items():
+            if not stack:
+                continue
+            seconds = count * self.interval
+            leaf = entry(stack[-1])
+            leaf[2] += seconds
+            for func in set(stack):
+                data = entry(func)
+                data[0] += count
+                data[1] += count
+                data[3] += seconds
+            for i in range(1, len(stack)):
+                caller, callee = stack[i - 1], stack[i]
+                callers = entry(callee)[4]
+                cc, nc, tt, ct = callers.get(caller, (0, 0, 0.0, 0.0))
+                if i == len(stack) - 1:
+                    tt += seconds
+                callers[caller] = (cc + count, nc + count, tt, ct + seconds)
+
+        return marshal.dumps({func: tuple(data) for func, data in stats.items()})
+
+
+def sample_profile(seconds: float, interval: float = 0.005) -> SampleProfile:
+    """Сэмплирование стеков всех потоков в течение seconds секунд"""
+    if not math.isfinite(seconds):
+        raise ValueError("Длительность профилирования должна быть конечным числом")
+    seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("Профилирование уже выполняется")
+
+    try:
+        me = threading.get_ident()
+        samples = Counter()
+        passes = 0
+        start = time.monotonic()
+        deadline = start + seconds
+        while time.monotonic() < deadline:
+            passes += 1
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                stack.reverse()
+                samples[(names.get(ident, str(ident)), tuple(stack))] += 1
+            time.sleep(interval)
+        return SampleProfile(samples, (time.monotonic() - start) / max(passes, 1))
+    finally:
+        _profile_lock.release()
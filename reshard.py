@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""Перераспределение аккаунтов между файлами БД (сервер должен быть остановлен)
+
+Пример: python reshard.py 1 4  - перейти с одной БД на 4 шарда
+"""
+import argparse
+import logging
+
+from steam_manager import reshard
+
+def main():
+    parser = argparse.ArgumentParser(description="Решардинг базы аккаунтов Steam")
+    parser.add_argument('old_shards', type=int, help="текущее число шардов")
+    parser.add_argument('new_shards', type=int, help="новое число шардов")
+    parser.add_argument('--db', default='steam_accounts.db', help="путь к базе (по умолчанию steam_accounts.db)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    moved = reshard(args.db, args.old_shards, args.new_shards)
+    print(f"✅ Перенесено аккаунтов: {moved}")
+
+if __name__ == '__main__':
+    main()
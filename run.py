@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import importlib.util
 import subprocess
 import sys
 import os
@@ -9,12 +10,10 @@ def install_requirements():
     subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
 
 def main():
-    # Проверяем зависимости
-    try:
-        import flask
-        import steam
+    # Проверяем зависимости без их импорта
+    if all(importlib.util.find_spec(name) for name in ('flask', 'steam')):
         print("✅ Все зависимости установлены")
-    except ImportError:
+    else:
         print("❌ Зависимости не установлены. Устанавливаем...")
         install_requirements()
     
@@ -23,8 +22,9 @@ def main():
     print("🌐 Веб-интерфейс доступен по адресу: http://localhost:5001")
     print("📱 Откройте в браузере на телефоне или компьютере")
     
-    from web_interface import app
-    app.run(host='0.0.0.0', port=5001, debug=False)
+    from web_interface import app, manager
+    from server import serve
+    serve(app, manager)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,38 @@
+"""Запуск HTTP сервера и общие эндпоинты состояния
+
+Модуль не создает менеджер и не настраивает логирование при импорте.
+"""
+from datetime import datetime
+
+from flask import jsonify
+
+# Если приложение запущено не через serve() (flask run, gunicorn и т.п.),
+# расписание загружается при первом запросе, но не позже чем через столько секунд
+SCHEDULER_START_DELAY = 5
+
+def init_app(app, manager):
+    """Эндпоинты /api/health и /api/ready и отложенный запуск планировщика"""
+    @app.before_request
+    def start_scheduler():
+        manager.start_scheduler()
+    
+    @app.route('/api/health', methods=['GET'])
+    def health_check():
+        """Проверка работы сервера"""
+        return jsonify({'status': 'ok', 'timestamp': datetime.now().isoformat()})
+    
+    @app.route('/api/ready', methods=['GET'])
+    def readiness_check():
+        """Проверка готовности: планировщик загрузил расписание"""
+        if manager.ready.is_set():
+            return jsonify({'status': 'ready', 'timestamp': datetime.now().isoformat()})
+        return jsonify({'status': 'starting', 'timestamp': datetime.now().isoformat()}), 503
+    
+    manager.start_scheduler(delay=SCHEDULER_START_DELAY)
+
+def serve(app, manager, host='0.0.0.0', port=5001):
+    """Запуск HTTP сервера, затем фоновая загрузка расписания"""
+    from werkzeug.serving import make_server
+    server = make_server(host, port, app, threaded=True)
+    manager.start_scheduler()
+    server.serve_forever()
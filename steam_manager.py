@@ -1,26 +1,416 @@
 import json
 import logging
+import os
+import re
+import shutil
 import sqlite3
 import threading
 import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from cryptography.fernet import Fernet
-from typing import List, Optional, Dict
-import steam.webauth as wa
-import steam.guard
+from typing import List, Optional, Dict, NamedTuple, Tuple
+
+# cryptography и steam импортируются лениво (см. cipher, generate_guard_code,
+# change_password): это заметно ускоряет запуск сервера.
 
 logger = logging.getLogger(__name__)
 
+# Число слотов для шардирования: слот аккаунта определяется хешем логина и
+# хранится в младших разрядах id (id = seq * SHARD_SLOTS + slot), поэтому
+# шард находится и по логину, и по id, а id не меняется при решардинге.
+SHARD_SLOTS = 64
+
+_ACCOUNTS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS accounts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        login TEXT UNIQUE NOT NULL,
+        encrypted_password TEXT NOT NULL,
+        encrypted_mafile TEXT NOT NULL,
+        nickname TEXT,
+        auto_change_enabled BOOLEAN DEFAULT 0,
+        change_interval_hours INTEGER DEFAULT 24,
+        last_password_change TIMESTAMP,
+        next_scheduled_change TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Журнал смен паролей: новый пароль записывается до запроса в Steam и
+# удаляется вместе с обновлением accounts. Оставшиеся записи после сбоя
+# разбираются при запуске (см. recover_rotations).
+_ROTATION_JOURNAL_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS rotation_journal (
+        account_id INTEGER PRIMARY KEY,
+        encrypted_password TEXT NOT NULL,
+        started_at TIMESTAMP NOT NULL
+    )
+'''
+
+ROTATION_COMMITTED = 'committed'
+ROTATION_ROLLED_BACK = 'rolled_back'
+ROTATION_IN_DOUBT = 'in_doubt'
+# Запись журнала уже разобрана (например, смена завершилась, пока восстановление ждало ее)
+ROTATION_NOT_PENDING = 'not_pending'
+
+# token восстановления в single-flight смены пароля: одновременные
+# восстановления объединяются, а смена с паролем ждет их окончания
+_RECOVERY = object()
+
+_ACCOUNT_COLUMNS = (
+    'id', 'login', 'encrypted_password', 'encrypted_mafile', 'nickname',
+    'auto_change_enabled', 'change_interval_hours', 'last_password_change',
+    'next_scheduled_change', 'created_at'
+)
+
+_ACCOUNT_INFO_COLUMNS = '''
+    id, login, nickname, auto_change_enabled, change_interval_hours,
+    last_password_change, next_scheduled_change
+'''
+
+# Та же выборка, но сразу в виде JSON объекта: список аккаунтов отдается
+# клиенту без расшифровки и без промежуточных объектов на каждую строку
+_ACCOUNT_JSON_SELECT = '''
+    SELECT json_object(
+        'id', id,
+        'login', login,
+        'nickname', nickname,
+        'auto_change_enabled', CASE WHEN auto_change_enabled THEN json('true') ELSE json('false') END,
+        'change_interval_hours', change_interval_hours,
+        'last_password_change', last_password_change,
+        'next_scheduled_change', next_scheduled_change,
+        'time_remaining_seconds', CASE WHEN last_password_change IS NOT NULL AND auto_change_enabled THEN
+            MAX(0, CAST((julianday(last_password_change, '+' || change_interval_hours || ' hours')
+                         - julianday('now', 'localtime')) * 86400 AS INTEGER))
+        END
+    ) AS account_json
+    FROM accounts
+'''
+
+
+class AccountInfo(NamedTuple):
+    """Метаданные аккаунта без пароля и maFile"""
+    id: int
+    login: str
+    nickname: Optional[str]
+    auto_change_enabled: bool
+    change_interval_hours: int
+    last_password_change: Optional[str]
+    next_scheduled_change: Optional[str]
+    
+    @classmethod
+    def from_row(cls, row: tuple) -> 'AccountInfo':
+        return cls(row[0], row[1], row[2], bool(row[3]), row[4], row[5], row[6])
+    
+    @property
+    def time_remaining_seconds(self) -> Optional[int]:
+        """Оставшееся время до смены пароля"""
+        if not (self.last_password_change and self.auto_change_enabled):
+            return None
+        last_change = datetime.fromisoformat(self.last_password_change)
+        next_change = last_change + timedelta(hours=self.change_interval_hours)
+        return max(0, int((next_change - datetime.now()).total_seconds()))
+    
+    def to_dict(self) -> dict:
+        data = self._asdict()
+        data['time_remaining_seconds'] = self.time_remaining_seconds
+        return data
+
+
+class AccountSecrets(NamedTuple):
+    """Расшифрованные данные для входа в Steam"""
+    login: str
+    password: str
+    mafile: dict
+
+
+class PendingRotation(NamedTuple):
+    """Запись журнала смены пароля вместе с текущими данными аккаунта
+    (поля аккаунта равны None, если он удален)"""
+    encrypted_candidate: bytes
+    login: Optional[str]
+    encrypted_password: Optional[bytes]
+    encrypted_mafile: Optional[bytes]
+    auto_change_enabled: Optional[bool]
+    change_interval_hours: Optional[int]
+
+
+class _Flight:
+    """Выполняющаяся операция, к которой могут присоединиться другие потоки"""
+    __slots__ = ('token', 'done', 'result', 'error')
+    
+    def __init__(self, token):
+        self.token = token
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _SingleFlight:
+    """Объединение одновременных одинаковых операций (single-flight).
+    
+    Пока операция с ключом выполняется, повторный вызов с тем же ключом и
+    token ждет ее и получает тот же результат; вызов с другим token ждет
+    завершения и запускается следом. Запись удаляется сразу по завершении,
+    поэтому таблица содержит только выполняющиеся операции.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[tuple, _Flight] = {}
+    
+    def __len__(self):
+        return len(self._flights)
+    
+    def do(self, key: tuple, fn, token=None):
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = _Flight(token)
+                    self._flights[key] = flight
+                    break
+            flight.done.wait()
+            if flight.token == token:
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+        
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+
+def login_slot(login: str) -> int:
+    """Слот шардирования для логина"""
+    return zlib.crc32(login.encode()) % SHARD_SLOTS
+
+
+def shard_paths(db_path: str, shards: int) -> List[str]:
+    """Пути к файлам шардов; при shards=1 используется сам db_path"""
+    if not 1 <= shards <= SHARD_SLOTS:
+        raise ValueError(f"Число шардов должно быть от 1 до {SHARD_SLOTS}")
+    if shards == 1:
+        return [db_path]
+    root, ext = os.path.splitext(db_path)
+    return [f"{root}.shard{i}{ext}" for i in range(shards)]
+
+
+def existing_db_files(db_path: str) -> List[str]:
+    """Существующие файлы БД рядом с db_path: сам db_path и любые файлы шардов"""
+    root, ext = os.path.splitext(db_path)
+    directory, name = os.path.split(root)
+    pattern = re.compile(re.escape(name) + r'\.shard(\d+)' + re.escape(ext) + '$')
+    paths = [db_path] if os.path.exists(db_path) else []
+    indexes = sorted(
+        int(match.group(1))
+        for match in map(pattern.match, os.listdir(directory or '.'))
+        if match
+    )
+    return paths + [f"{root}.shard{i}{ext}" for i in indexes]
+
+
+def _row_count(path: str, table: str) -> int:
+    """Число строк в таблице (0, если таблицы нет); файл не изменяется"""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        conn.close()
+
+
+def reshard_state_path(db_path: str) -> str:
+    """Файл состояния решардинга: существует, пока файлы шардов подменяются"""
+    return db_path + '.reshard-state'
+
+
+def reshard(db_path: str, old_shards: int, new_shards: int) -> int:
+    """Перераспределение аккаунтов по новому числу шардов (сервер должен быть остановлен).
+    
+    Id аккаунтов сохраняются, если уже закодированы по слоту логина;
+    остальным (например, из обычной БД) при переходе на шарды выдаются новые.
+    Возвращает число перенесенных аккаунтов.
+    
+    Перед подменой файлов все затрагиваемые файлы сохраняются в резервные
+    копии (.bak) и создается файл состояния. Если решардинг прервется,
+    повторный запуск сначала вернет исходные файлы.
+    """
+    old_paths = shard_paths(db_path, old_shards)
+    new_paths = shard_paths(db_path, new_shards)
+    _restore_interrupted_reshard(db_path)
+    
+    # Аккаунты вне old_shards означают, что текущее число шардов указано неверно:
+    # такие файлы были бы перезаписаны или потеряны
+    for path in existing_db_files(db_path):
+        if path not in old_paths and _row_count(path, 'accounts'):
+            raise RuntimeError(
+                f"В {path} есть аккаунты, но он не входит в {old_shards} шард(ов): "
+                f"проверьте текущее число шардов"
+            )
+    
+    rows = []
+    for path in old_paths:
+        if not os.path.exists(path):
+            continue
+        if _row_count(path, 'rotation_journal'):
+            raise RuntimeError(f"В {path} есть незавершенные смены паролей, сначала выполните восстановление")
+        if not _row_count(path, 'accounts'):
+            continue
+        conn = sqlite3.connect(path)
+        rows.extend(conn.execute(f"SELECT {', '.join(_ACCOUNT_COLUMNS)} FROM accounts").fetchall())
+        conn.close()
+    
+    # Сначала аккаунты с корректными id, затем те, которым нужен новый id
+    placed = [[] for _ in new_paths]
+    pending = []
+    for row in rows:
+        slot = login_slot(row[1])
+        if new_shards == 1 or row[0] % SHARD_SLOTS == slot:
+            placed[slot % new_shards].append(row)
+        else:
+            pending.append((slot, row))
+    for slot, row in pending:
+        target = placed[slot % new_shards]
+        max_id = max((r[0] for r in target), default=0)
+        target.append((_next_account_id(max_id, slot),) + tuple(row[1:]))
+    
+    placeholders = ', '.join('?' * len(_ACCOUNT_COLUMNS))
+    tmp_paths = [path + '.reshard' for path in new_paths]
+    for tmp_path, shard_rows in zip(tmp_paths, placed):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        conn.execute(_ACCOUNTS_SCHEMA)
+        conn.execute(_ROTATION_JOURNAL_SCHEMA)
+        conn.executemany(
+            f"INSERT INTO accounts ({', '.join(_ACCOUNT_COLUMNS)}) VALUES ({placeholders})",
+            shard_rows
+        )
+        conn.commit()
+        conn.close()
+    
+    # Резервные копии всех затрагиваемых файлов, затем файл состояния: с этого
+    # момента прерванный решардинг откатывается при следующем запуске
+    backups = {}
+    for path in dict.fromkeys(old_paths + new_paths):
+        if os.path.exists(path):
+            backups[path] = _backup_file(path)
+    _write_reshard_state(db_path, {
+        'old_shards': old_shards,
+        'new_shards': new_shards,
+        'backups': backups,
+        'created': [path for path in new_paths if path not in backups]
+    })
+    
+    for tmp_path, path in zip(tmp_paths, new_paths):
+        os.replace(tmp_path, path)
+    for path in old_paths:
+        if path not in new_paths and os.path.exists(path):
+            os.remove(path)
+    
+    os.remove(reshard_state_path(db_path))
+    for backup in backups.values():
+        os.remove(backup)
+    
+    logger.info(f"Решардинг {old_shards} -> {new_shards}: перенесено {len(rows)} аккаунтов")
+    return len(rows)
+
+
+def _backup_file(path: str) -> str:
+    """Резервная копия файла (жесткая ссылка, если файловая система позволяет)"""
+    backup = path + '.bak'
+    if os.path.exists(backup):
+        os.remove(backup)
+    try:
+        os.link(path, backup)
+    except OSError:
+        shutil.copy2(path, backup)
+    return backup
+
+
+def _write_reshard_state(db_path: str, state: dict):
+    """Атомарная запись файла состояния решардинга"""
+    state_path = reshard_state_path(db_path)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, state_path)
+
+
+def _restore_interrupted_reshard(db_path: str):
+    """Возврат исходных файлов после прерванного решардинга"""
+    state_path = reshard_state_path(db_path)
+    if not os.path.exists(state_path):
+        return
+    with open(state_path, encoding='utf-8') as f:
+        state = json.load(f)
+    for path in state['created']:
+        if os.path.exists(path):
+            os.remove(path)
+    for path, backup in state['backups'].items():
+        if os.path.exists(backup):
+            os.replace(backup, path)
+    os.remove(state_path)
+    logger.warning(
+        f"Решардинг {state['old_shards']} -> {state['new_shards']} был прерван, исходные файлы восстановлены"
+    )
+
+
+def _next_account_id(max_id: int, slot: int) -> int:
+    """Следующий id в шарде, закодированный слотом логина"""
+    return (max_id // SHARD_SLOTS + 1) * SHARD_SLOTS + slot
+
+
 class SteamAccountManager:
-    def __init__(self, db_path: str = "steam_accounts.db"):
+    def __init__(self, db_path: str = "steam_accounts.db", autostart_scheduler: bool = True,
+                 shards: int = 1):
         self.db_path = db_path
-        self.cipher = self._init_encryption()
+        self.shards = shards
+        self.shard_paths = shard_paths(db_path, shards)
+        self._check_shard_files()
+        self._cipher = None
+        self._cipher_lock = threading.Lock()
         self.timers: Dict[int, threading.Timer] = {}
+        self.ready = threading.Event()
+        # Задержка (сек) между плановым и фактическим стартом последних автосмен
+        self.scheduler_lag = deque(maxlen=256)
+        # Одновременные смены пароля, генерация кода и восстановление одного
+        # аккаунта выполняются один раз, остальные вызовы получают тот же результат
+        self._flights = _SingleFlight()
+        self._scheduler_thread: Optional[threading.Thread] = None
+        self._scheduler_lock = threading.Lock()
+        self._scheduler_start = threading.Event()
+        self._scheduler_stop = threading.Event()
         self._init_database()
-        self._load_scheduled_changes()
+        if autostart_scheduler:
+            self.recover_rotations()
+            self._load_scheduled_changes()
+            self.ready.set()
+    
+    @property
+    def cipher(self):
+        """Шифр Fernet, создается при первом обращении"""
+        if self._cipher is None:
+            with self._cipher_lock:
+                if self._cipher is None:
+                    self._cipher = self._init_encryption()
+        return self._cipher
     
-    def _init_encryption(self) -> Fernet:
+    def _init_encryption(self):
         """Инициализация шифрования"""
+        from cryptography.fernet import Fernet
         try:
             # Пробуем загрузить существующий ключ
             with open('encryption.key', 'rb') as f:
@@ -32,38 +422,224 @@ class SteamAccountManager:
                 f.write(key)
         return Fernet(key)
     
+    def _check_shard_files(self):
+        """Не запускаться, если аккаунты лежат в файлах вне текущей схемы
+        шардов (например, обычная БД при shards > 1 или шарды при shards=1)"""
+        state_path = reshard_state_path(self.db_path)
+        if os.path.exists(state_path):
+            with open(state_path, encoding='utf-8') as f:
+                state = json.load(f)
+            raise RuntimeError(
+                f"Решардинг {self.db_path} был прерван. Повторите его: "
+                f"python reshard.py {state['old_shards']} {state['new_shards']} --db {self.db_path}"
+            )
+        
+        existing = existing_db_files(self.db_path)
+        for path in existing:
+            if path in self.shard_paths:
+                continue
+            count = _row_count(path, 'accounts')
+            if count:
+                current = 1 if path == self.db_path else len([p for p in existing if p != self.db_path])
+                raise RuntimeError(
+                    f"В {path} есть аккаунты ({count}), а включено шардов: {self.shards}. "
+                    f"Сначала перенесите их: python reshard.py {current} {self.shards} --db {self.db_path}"
+                )
+    
     def _init_database(self):
-        """Инициализация базы данных"""
-        conn = sqlite3.connect(self.db_path)
+        """Инициализация базы данных (всех шардов)"""
+        for path in self.shard_paths:
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+            cursor.execute(_ACCOUNTS_SCHEMA)
+            cursor.execute(_ROTATION_JOURNAL_SCHEMA)
+            conn.commit()
+            conn.close()
+    
+    def _db_for_id(self, account_id: int) -> str:
+        """Файл шарда, в котором хранится аккаунт с данным id"""
+        return self.shard_paths[(account_id % SHARD_SLOTS) % self.shards]
+    
+    def _db_for_login(self, login: str) -> str:
+        """Файл шарда для логина"""
+        return self.shard_paths[login_slot(login) % self.shards]
+    
+    def start_scheduler(self, delay: float = 0) -> threading.Thread:
+        """Фоновая загрузка расписания (вызывается после запуска HTTP сервера).
+        
+        С delay > 0 загрузка начнется не позже чем через delay секунд;
+        вызов без задержки (в том числе повторный) запускает ее сразу.
+        """
+        with self._scheduler_lock:
+            if self._scheduler_thread is None:
+                self._scheduler_thread = threading.Thread(
+                    target=self._warm_up_scheduler, args=(delay,), name="scheduler-warmup", daemon=True
+                )
+                self._scheduler_thread.start()
+        if not delay:
+            self._scheduler_start.set()
+        return self._scheduler_thread
+    
+    def stop_scheduler(self):
+        """Остановка планировщика: отменяет таймеры и еще не начатую загрузку"""
+        self._scheduler_stop.set()
+        self._scheduler_start.set()
+        for timer in list(self.timers.values()):
+            timer.cancel()
+    
+    def _warm_up_scheduler(self, delay: float = 0):
+        """Восстанавливает прерванные смены, взводит таймеры, отмечает готовность
+        и затем выполняет просроченные смены"""
+        self._scheduler_start.wait(timeout=delay)
+        if self._scheduler_stop.is_set():
+            return
+        self.recover_rotations()
+        overdue = self._load_scheduled_changes(run_overdue=False)
+        self.ready.set()
+        logger.info(f"Планировщик готов, просроченных смен: {len(overdue)}")
+        for account_id, due in overdue:
+            if self._scheduler_stop.is_set():
+                break
+            self._change_password_async(account_id, due)
+    
+    def recover_rotations(self, max_workers: int = 8) -> Dict[int, str]:
+        """Разбор незавершенных смен паролей из журнала после сбоя"""
+        account_ids = []
+        for path in self.shard_paths:
+            conn = sqlite3.connect(path)
+            account_ids.extend(row[0] for row in conn.execute('SELECT account_id FROM rotation_journal'))
+            conn.close()
+        if not account_ids:
+            return {}
+        
+        logger.info(f"Незавершенных смен паролей: {len(account_ids)}, восстанавливаем")
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rotation-recovery") as pool:
+            results = dict(zip(account_ids, pool.map(self._recover_rotation_once, account_ids)))
+        
+        in_doubt = [account_id for account_id, state in results.items() if state == ROTATION_IN_DOUBT]
+        if in_doubt:
+            logger.warning(f"Не удалось проверить смену пароля для аккаунтов: {in_doubt}")
+        return results
+    
+    def _recover_rotation_once(self, account_id: int) -> str:
+        """Восстановление под тем же ключом, что и смена пароля: идущая смена
+        сначала завершается, и запись журнала перечитывается уже после нее"""
+        return self._flights.do(
+            ('rotate', account_id), lambda: self._recover_rotation(account_id), token=_RECOVERY
+        )
+    
+    def _recover_rotation(self, account_id: int) -> str:
+        """Проверка одной прерванной смены: вход с новым паролем, а если он не
+        принят - контрольный вход с сохраненным"""
+        try:
+            conn = sqlite3.connect(self._db_for_id(account_id))
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT j.encrypted_password, a.login, a.encrypted_password, a.encrypted_mafile,
+                       a.auto_change_enabled, a.change_interval_hours
+                FROM rotation_journal j LEFT JOIN accounts a ON a.id = j.account_id
+                WHERE j.account_id = ?
+            ''', (account_id,))
+            row = cursor.fetchone()
+            conn.close()
+            if not row:
+                return ROTATION_NOT_PENDING
+            pending = PendingRotation(*row)
+            if pending.login is None:
+                # Аккаунт уже удален
+                self._rollback_rotation(account_id)
+                return ROTATION_ROLLED_BACK
+            
+            import steam.guard
+            import steam.webauth as wa
+            
+            login = pending.login
+            candidate = self.cipher.decrypt(pending.encrypted_candidate).decode()
+            mafile = json.loads(self.cipher.decrypt(pending.encrypted_mafile).decode())
+            
+            try:
+                user = wa.WebAuth(login, candidate)
+                user.login(twofactor_code=steam.guard.generate_code(mafile.get('shared_secret')))
+            except wa.LoginIncorrect:
+                # LoginIncorrect бывает и при ограничении попыток входа, поэтому
+                # откатываем, только если сохраненный пароль действительно подходит.
+                # Иначе новый пароль мог быть принят - оставляем запись журнала.
+                current = self.cipher.decrypt(pending.encrypted_password).decode()
+                user = wa.WebAuth(login, current)
+                user.login(twofactor_code=steam.guard.generate_code(mafile.get('shared_secret')))
+                self._rollback_rotation(account_id)
+                logger.info(f"Смена пароля для {account_id} откатена")
+                return ROTATION_ROLLED_BACK
+            
+            # Смена прошла: отмечаем ее, чтобы планировщик не запустил ее повторно
+            next_change = (
+                datetime.now() + timedelta(hours=pending.change_interval_hours)
+                if pending.auto_change_enabled else None
+            )
+            self._commit_rotation(account_id, pending.encrypted_candidate, next_change)
+            logger.info(f"Смена пароля для {account_id} восстановлена")
+            return ROTATION_COMMITTED
+        except Exception as e:
+            logger.error(f"Ошибка восстановления смены пароля для {account_id}: {e}")
+            return ROTATION_IN_DOUBT
+    
+    def _journal_rotation(self, account_id: int, encrypted_password: bytes):
+        """Запись нового пароля в журнал до запроса в Steam"""
+        conn = sqlite3.connect(self._db_for_id(account_id))
+        conn.execute(
+            'INSERT OR REPLACE INTO rotation_journal (account_id, encrypted_password, started_at) VALUES (?, ?, ?)',
+            (account_id, encrypted_password, datetime.now().isoformat())
+        )
+        conn.commit()
+        conn.close()
+    
+    def _commit_rotation(self, account_id: int, encrypted_password: bytes,
+                         next_change: Optional[datetime] = None):
+        """Сохранение нового пароля и удаление записи журнала одной транзакцией"""
+        conn = sqlite3.connect(self._db_for_id(account_id))
         cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS accounts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                login TEXT UNIQUE NOT NULL,
-                encrypted_password TEXT NOT NULL,
-                encrypted_mafile TEXT NOT NULL,
-                nickname TEXT,
-                auto_change_enabled BOOLEAN DEFAULT 0,
-                change_interval_hours INTEGER DEFAULT 24,
-                last_password_change TIMESTAMP,
-                next_scheduled_change TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        cursor.execute(
+            'UPDATE accounts SET encrypted_password = ? WHERE id = ?',
+            (encrypted_password, account_id)
+        )
+        if next_change:
+            cursor.execute(
+                'UPDATE accounts SET last_password_change = ?, next_scheduled_change = ? WHERE id = ?',
+                (datetime.now().isoformat(), next_change.isoformat(), account_id)
             )
-        ''')
+        cursor.execute('DELETE FROM rotation_journal WHERE account_id = ?', (account_id,))
         conn.commit()
         conn.close()
     
-    def _load_scheduled_changes(self):
+    def _rollback_rotation(self, account_id: int):
+        """Удаление записи журнала: пароль в Steam не менялся"""
+        conn = sqlite3.connect(self._db_for_id(account_id))
+        conn.execute('DELETE FROM rotation_journal WHERE account_id = ?', (account_id,))
+        conn.commit()
+        conn.close()
+    
+    def _has_pending_rotation(self, account_id: int) -> bool:
+        conn = sqlite3.connect(self._db_for_id(account_id))
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM rotation_journal WHERE account_id = ?', (account_id,))
+        pending = cursor.fetchone() is not None
+        conn.close()
+        return pending
+    
+    def _load_scheduled_changes(self, run_overdue: bool = True) -> List[Tuple[int, datetime]]:
         """Загрузка запланированных смен паролей при запуске"""
+        overdue = []
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, next_scheduled_change FROM accounts 
-                WHERE auto_change_enabled = 1 AND next_scheduled_change IS NOT NULL
-            ''')
-            rows = cursor.fetchall()
-            conn.close()
+            rows = []
+            for path in self.shard_paths:
+                conn = sqlite3.connect(path)
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, next_scheduled_change FROM accounts 
+                    WHERE auto_change_enabled = 1 AND next_scheduled_change IS NOT NULL
+                ''')
+                rows.extend(cursor.fetchall())
+                conn.close()
             
             for account_id, next_change in rows:
                 if next_change:
@@ -72,9 +648,14 @@ class SteamAccountManager:
                         self._schedule_password_change(account_id, next_change_dt)
                     else:
                         # Время уже прошло, меняем пароль немедленно
-                        self._change_password_async(account_id)
+                        overdue.append((account_id, next_change_dt))
         except Exception as e:
             logger.error(f"Ошибка загрузки расписания: {e}")
+        
+        if run_overdue:
+            for account_id, due in overdue:
+                self._change_password_async(account_id, due)
+        return overdue
     
     def add_account(self, login: str, password: str, mafile_json: dict, nickname: str = None) -> bool:
         """Добавление аккаунта в базу"""
@@ -82,12 +663,22 @@ class SteamAccountManager:
             encrypted_password = self.cipher.encrypt(password.encode())
             encrypted_mafile = self.cipher.encrypt(json.dumps(mafile_json).encode())
             
-            conn = sqlite3.connect(self.db_path)
+            conn = sqlite3.connect(self._db_for_login(login))
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO accounts (login, encrypted_password, encrypted_mafile, nickname)
-                VALUES (?, ?, ?, ?)
-            ''', (login, encrypted_password, encrypted_mafile, nickname or login))
+            if self.shards == 1:
+                cursor.execute('''
+                    INSERT INTO accounts (login, encrypted_password, encrypted_mafile, nickname)
+                    VALUES (?, ?, ?, ?)
+                ''', (login, encrypted_password, encrypted_mafile, nickname or login))
+            else:
+                # id кодирует слот логина, чтобы находить шард по id
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute('SELECT COALESCE(MAX(id), 0) FROM accounts')
+                account_id = _next_account_id(cursor.fetchone()[0], login_slot(login))
+                cursor.execute('''
+                    INSERT INTO accounts (id, login, encrypted_password, encrypted_mafile, nickname)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (account_id, login, encrypted_password, encrypted_mafile, nickname or login))
             conn.commit()
             conn.close()
             
@@ -97,53 +688,54 @@ class SteamAccountManager:
             logger.error(f"Ошибка добавления аккаунта: {e}")
             return False
     
-    def get_accounts(self) -> List[dict]:
-        """Получение списка аккаунтов"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, login, encrypted_password, encrypted_mafile, nickname, 
-                   auto_change_enabled, change_interval_hours, 
-                   last_password_change, next_scheduled_change
-            FROM accounts
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
+    def get_accounts(self) -> List[AccountInfo]:
+        """Получение списка аккаунтов (без расшифровки секретов)"""
+        rows = []
+        for path in self.shard_paths:
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT {_ACCOUNT_INFO_COLUMNS} FROM accounts')
+            rows.extend(cursor.fetchall())
+            conn.close()
         
-        accounts = []
-        for row in rows:
+        return [AccountInfo.from_row(row) for row in rows]
+    
+    def get_accounts_json(self) -> str:
+        """Ответ со списком аккаунтов в JSON, собранный прямо в SQLite"""
+        parts = []
+        for path in self.shard_paths:
+            conn = sqlite3.connect(path)
             try:
-                password = self.cipher.decrypt(row[2]).decode()
-                mafile = json.loads(self.cipher.decrypt(row[3]).decode())
-                
-                # Рассчитываем оставшееся время до смены пароля
-                time_remaining = None
-                if row[7] and row[5]:  # last_password_change и auto_change_enabled
-                    last_change = datetime.fromisoformat(row[7])
-                    next_change = last_change + timedelta(hours=row[6])
-                    time_remaining = max(0, int((next_change - datetime.now()).total_seconds()))
-                
-                accounts.append({
-                    'id': row[0],
-                    'login': row[1],
-                    'password': password,
-                    'mafile': mafile,
-                    'nickname': row[4],
-                    'auto_change_enabled': bool(row[5]),
-                    'change_interval_hours': row[6],
-                    'last_password_change': row[7],
-                    'next_scheduled_change': row[8],
-                    'time_remaining_seconds': time_remaining
-                })
-            except Exception as e:
-                logger.error(f"Ошибка расшифровки аккаунта {row[1]}: {e}")
+                accounts_json = conn.execute(
+                    f"SELECT group_concat(account_json, ',') FROM ({_ACCOUNT_JSON_SELECT})"
+                ).fetchone()[0]
+            finally:
+                conn.close()
+            if accounts_json:
+                parts.append(accounts_json)
+        return '{"success": true, "accounts": [' + ','.join(parts) + ']}'
+    
+    def _get_account_secrets(self, account_id: int) -> Optional[AccountSecrets]:
+        """Логин, пароль и maFile одного аккаунта"""
+        conn = sqlite3.connect(self._db_for_id(account_id))
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT login, encrypted_password, encrypted_mafile FROM accounts WHERE id = ?',
+            (account_id,)
+        )
+        row = cursor.fetchone()
+        conn.close()
         
-        return accounts
+        if not row:
+            return None
+        password = self.cipher.decrypt(row[1]).decode()
+        mafile = json.loads(self.cipher.decrypt(row[2]).decode())
+        return AccountSecrets(row[0], password, mafile)
     
     def set_auto_password_change(self, account_id: int, enabled: bool, interval_hours: int = 24) -> bool:
         """Включение/выключение автоматической смены пароля"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = sqlite3.connect(self._db_for_id(account_id))
             cursor = conn.cursor()
             
             next_scheduled_change = None
@@ -179,23 +771,26 @@ class SteamAccountManager:
                 self.timers[account_id].cancel()
             
             delay = (change_time - datetime.now()).total_seconds()
-            if delay > 0:
-                timer = threading.Timer(delay, self._change_password_async, [account_id])
+            if delay > 0 and not self._scheduler_stop.is_set():
+                timer = threading.Timer(delay, self._change_password_async, [account_id, change_time])
+                timer.name = f"rotation-timer-{account_id}"
                 timer.start()
                 self.timers[account_id] = timer
                 logger.info(f"Смена пароля для {account_id} запланирована через {delay} секунд")
         except Exception as e:
             logger.error(f"Ошибка планирования смены пароля: {e}")
     
-    def _change_password_async(self, account_id: int):
+    def _change_password_async(self, account_id: int, due: Optional[datetime] = None):
         """Асинхронная смена пароля (вызывается по таймеру)"""
         try:
+            if due:
+                self.scheduler_lag.append((datetime.now() - due).total_seconds())
             logger.info(f"Запуск автоматической смены пароля для аккаунта {account_id}")
             result = self.change_password(account_id)
             
             if result['success']:
                 # Обновляем время последней смены и планируем следующую
-                conn = sqlite3.connect(self.db_path)
+                conn = sqlite3.connect(self._db_for_id(account_id))
                 cursor = conn.cursor()
                 cursor.execute('SELECT change_interval_hours FROM accounts WHERE id = ?', (account_id,))
                 interval = cursor.fetchone()[0]
@@ -219,13 +814,17 @@ class SteamAccountManager:
     
     def generate_guard_code(self, account_id: int) -> Optional[str]:
         """Генерация кода Steam Guard"""
+        return self._flights.do(('code', account_id), lambda: self._generate_guard_code(account_id))
+    
+    def _generate_guard_code(self, account_id: int) -> Optional[str]:
+        """Генерация кода без объединения вызовов"""
         try:
-            accounts = self.get_accounts()
-            account = next((acc for acc in accounts if acc['id'] == account_id), None)
+            import steam.guard
+            account = self._get_account_secrets(account_id)
             if not account:
                 return None
             
-            shared_secret = account['mafile'].get('shared_secret')
+            shared_secret = account.mafile.get('shared_secret')
             if not shared_secret:
                 return None
             
@@ -235,21 +834,38 @@ class SteamAccountManager:
             return None
     
     def change_password(self, account_id: int, new_password: Optional[str] = None) -> dict:
-        """Смена пароля аккаунта"""
+        """Смена пароля аккаунта.
+        
+        Одновременные смены одного аккаунта не выполняются параллельно: вызов
+        с тем же new_password (или оба без него) получает результат уже идущей
+        смены, вызов с другим паролем ждет ее окончания.
+        """
+        return self._flights.do(
+            ('rotate', account_id), lambda: self._change_password(account_id, new_password), token=new_password
+        )
+    
+    def _change_password(self, account_id: int, new_password: Optional[str] = None) -> dict:
+        """Смена пароля без объединения вызовов"""
         try:
-            accounts = self.get_accounts()
-            account = next((acc for acc in accounts if acc['id'] == account_id), None)
+            # Предыдущая смена прервана: сначала выясняем, какой пароль действует
+            if self._has_pending_rotation(account_id):
+                # Уже внутри single-flight смены этого аккаунта
+                if self._recover_rotation(account_id) == ROTATION_IN_DOUBT:
+                    return {'success': False, 'error': 'Предыдущая смена пароля не завершена, повторите позже'}
+            
+            account = self._get_account_secrets(account_id)
             if not account:
                 return {'success': False, 'error': 'Аккаунт не найден'}
             
-            login = account['login']
-            current_password = account['password']
-            mafile = account['mafile']
+            login, current_password, mafile = account
             
             # Генерируем новый пароль если не указан
             if not new_password:
                 new_password = self._generate_strong_password()
             
+            import steam.guard
+            import steam.webauth as wa
+            
             # Создаем сессию Steam
             user = wa.WebAuth(login, current_password)
             
@@ -262,18 +878,16 @@ class SteamAccountManager:
             
             # Логинимся и меняем пароль
             user.login(twofactor_code=guard_code)
+            
+            # Новый пароль попадает в журнал до запроса в Steam: если смена
+            # прервется, он будет проверен при восстановлении. При ошибке запись
+            # остается - неизвестно, применил ли Steam смену.
+            encrypted_password = self.cipher.encrypt(new_password.encode())
+            self._journal_rotation(account_id, encrypted_password)
             user.change_password(new_password)
             
             # Обновляем пароль в базе
-            encrypted_password = self.cipher.encrypt(new_password.encode())
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
-                'UPDATE accounts SET encrypted_password = ? WHERE id = ?',
-                (encrypted_password, account_id)
-            )
-            conn.commit()
-            conn.close()
+            self._commit_rotation(account_id, encrypted_password)
             
             return {
                 'success': True,
@@ -300,9 +914,10 @@ class SteamAccountManager:
                 self.timers[account_id].cancel()
                 del self.timers[account_id]
             
-            conn = sqlite3.connect(self.db_path)
+            conn = sqlite3.connect(self._db_for_id(account_id))
             cursor = conn.cursor()
             cursor.execute('DELETE FROM accounts WHERE id = ?', (account_id,))
+            cursor.execute('DELETE FROM rotation_journal WHERE account_id = ?', (account_id,))
             conn.commit()
             conn.close()
             
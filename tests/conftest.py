@@ -0,0 +1,83 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+class FakeCipher:
+    """Шифр без шифрования: тестам не нужен encryption.key"""
+
+    def encrypt(self, data: bytes) -> bytes:
+        return data
+
+    def decrypt(self, data) -> bytes:
+        return data if isinstance(data, bytes) else data.encode()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Пустой рабочий каталог: steam_accounts.db и encryption.key создаются в нем"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def make_manager(workdir):
+    """Фабрика менеджеров на временной БД без запуска планировщика"""
+    from steam_manager import SteamAccountManager
+
+    managers = []
+
+    def factory(**kwargs):
+        kwargs.setdefault('db_path', str(workdir / 'steam_accounts.db'))
+        kwargs.setdefault('autostart_scheduler', False)
+        manager = SteamAccountManager(**kwargs)
+        manager._cipher = FakeCipher()
+        managers.append(manager)
+        return manager
+
+    yield factory
+    for manager in managers:
+        manager.stop_scheduler()
+
+
+@pytest.fixture
+def fake_steam(monkeypatch):
+    """Подменяет steam.webauth / steam.guard локальным FakeSteam"""
+    from fake_steam import FakeSteam
+
+    steam = FakeSteam()
+    for name, module in steam.modules().items():
+        monkeypatch.setitem(sys.modules, name, module)
+    return steam
+
+
+@pytest.fixture
+def account(make_manager, fake_steam):
+    """Менеджер с одним аккаунтом, пароль которого известен FakeSteam"""
+    manager = make_manager()
+    manager.add_account('alice', 'old-password', {'shared_secret': 'x'})
+    fake_steam.passwords['alice'] = 'old-password'
+    return manager, manager.get_accounts()[0].id
+
+
+ADMIN_TOKEN = 'admin-secret'
+
+
+@pytest.fixture
+def api_server(workdir, monkeypatch):
+    """Свежий модуль api_server на временной БД, токен администратора ADMIN_TOKEN"""
+    pytest.importorskip('flask')
+    pytest.importorskip('flask_cors')
+    monkeypatch.setenv('STEAM_ADMIN_TOKEN', ADMIN_TOKEN)
+    sys.modules.pop('api_server', None)
+    module = importlib.import_module('api_server')
+    module.manager._cipher = FakeCipher()
+    yield module
+    module.manager.stop_scheduler()
+    sys.modules.pop('api_server', None)
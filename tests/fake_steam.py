@@ -0,0 +1,95 @@
+"""Локальная замена Steam (steam.webauth / steam.guard) с внедрением сбоев"""
+import threading
+import time
+import types
+
+
+class WebAuthException(Exception):
+    pass
+
+
+class LoginIncorrect(WebAuthException):
+    pass
+
+
+class FakeSteam:
+    """Состояние «сервера» Steam: действующие пароли и счетчики запросов.
+
+    Сбои задаются списками исключений, которые выбрасываются по очереди:
+      login_failures         - при входе, до проверки пароля
+      change_failures        - при смене пароля, до ее применения
+      change_failures_after  - при смене пароля, после ее применения
+    throttled=True - любой вход отвечает LoginIncorrect, как при ограничении попыток.
+    """
+
+    def __init__(self):
+        self.passwords = {}
+        self.logins = 0
+        self.login_log = []
+        self.changes = 0
+        self.login_failures = []
+        self.change_failures = []
+        self.change_failures_after = []
+        self.throttled = False
+        self.latency = 0.0
+        self._lock = threading.Lock()
+
+    def login(self, username, password, twofactor_code):
+        with self._lock:
+            self.logins += 1
+            self.login_log.append((username, password))
+            failure = self.login_failures.pop(0) if self.login_failures else None
+        if self.latency:
+            time.sleep(self.latency)
+        if failure:
+            raise failure
+        if self.throttled:
+            raise LoginIncorrect("There have been too many login failures")
+        if twofactor_code != generate_code('x') or self.passwords.get(username) != password:
+            raise LoginIncorrect("The account name or password that you have entered is incorrect.")
+
+    def change_password(self, username, new_password):
+        with self._lock:
+            self.changes += 1
+            failure = self.change_failures.pop(0) if self.change_failures else None
+            failure_after = self.change_failures_after.pop(0) if self.change_failures_after else None
+        if failure:
+            raise failure
+        self.passwords[username] = new_password
+        if failure_after:
+            raise failure_after
+
+    def modules(self) -> dict:
+        """Модули для подстановки в sys.modules"""
+        fake = self
+
+        class WebAuth:
+            def __init__(self, username, password=''):
+                self.username = username
+                self.password = password
+                self.logged_on = False
+
+            def login(self, twofactor_code=''):
+                fake.login(self.username, self.password, twofactor_code)
+                self.logged_on = True
+
+            def change_password(self, new_password):
+                assert self.logged_on
+                fake.change_password(self.username, new_password)
+
+        webauth = types.ModuleType('steam.webauth')
+        webauth.WebAuth = WebAuth
+        webauth.WebAuthException = WebAuthException
+        webauth.LoginIncorrect = LoginIncorrect
+
+        guard = types.ModuleType('steam.guard')
+        guard.generate_code = generate_code
+
+        steam = types.ModuleType('steam')
+        steam.webauth = webauth
+        steam.guard = guard
+        return {'steam': steam, 'steam.webauth': webauth, 'steam.guard': guard}
+
+
+def generate_code(shared_secret) -> str:
+    return f'CODE-{shared_secret}'
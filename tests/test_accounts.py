@@ -0,0 +1,133 @@
+import json
+import sqlite3
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytest
+
+from steam_manager import AccountInfo
+
+
+def add_accounts(manager, count):
+    for i in range(count):
+        assert manager.add_account(f'user{i}', 'secret', {'shared_secret': 'c2VjcmV0'}, f'nick{i}')
+
+
+def allocated_per_item(make, rows):
+    """Память (байт) на один объект, созданный make из строки БД"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        items = [make(row) for row in rows]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert len(items) == len(rows)
+    return (after - before) / len(rows)
+
+
+def test_account_info_is_compact():
+    count = 10000
+    now = datetime.now().isoformat()
+    # Значения полей созданы заранее: сравниваются только сами записи
+    rows = [(i, f'user{i}', f'nick{i}', 1, 24, now, now) for i in range(count)]
+    keys = ('id', 'login', 'nickname', 'auto_change_enabled', 'change_interval_hours',
+            'last_password_change', 'next_scheduled_change')
+
+    record = allocated_per_item(AccountInfo.from_row, rows)
+    as_dict = allocated_per_item(lambda row: dict(zip(keys, row)), rows)
+
+    assert not hasattr(AccountInfo.from_row(rows[0]), '__dict__')
+    # Кортеж из 7 указателей против хеш-таблицы с ключами
+    assert record <= 150
+    assert record * 2 < as_dict
+
+
+def test_get_accounts_does_not_decrypt(make_manager):
+    manager = make_manager()
+    add_accounts(manager, 3)
+
+    class NoDecrypt:
+        def decrypt(self, data):
+            raise AssertionError("список аккаунтов не должен расшифровывать секреты")
+
+    manager._cipher = NoDecrypt()
+    accounts = manager.get_accounts()
+    json.loads(manager.get_accounts_json())
+
+    assert [acc.login for acc in accounts] == ['user0', 'user1', 'user2']
+    assert all(isinstance(acc, AccountInfo) for acc in accounts)
+
+
+def test_accounts_json_matches_account_info(make_manager):
+    manager = make_manager()
+    add_accounts(manager, 3)
+    conn = sqlite3.connect(manager.db_path)
+    last_change = (datetime.now() - timedelta(hours=3)).isoformat()
+    conn.execute(
+        'UPDATE accounts SET auto_change_enabled = 1, change_interval_hours = 24, '
+        'last_password_change = ?, next_scheduled_change = ? WHERE login = ?',
+        (last_change, (datetime.now() + timedelta(hours=21)).isoformat(), 'user0')
+    )
+    # Смена была, но автосмена выключена - оставшееся время не показывается
+    conn.execute('UPDATE accounts SET last_password_change = ? WHERE login = ?', (last_change, 'user1'))
+    conn.commit()
+    conn.close()
+
+    body = json.loads(manager.get_accounts_json())
+    remaining = body['accounts'][0]['time_remaining_seconds']
+    assert 21 * 3600 - 5 <= remaining <= 21 * 3600
+    assert body['accounts'][0]['auto_change_enabled'] is True
+    assert body['accounts'][1]['time_remaining_seconds'] is None
+    expected = [acc.to_dict() for acc in manager.get_accounts()]
+
+    assert body['success'] is True
+    assert len(body['accounts']) == len(expected) == 3
+    for got, want in zip(body['accounts'], expected):
+        got_remaining = got.pop('time_remaining_seconds')
+        want_remaining = want.pop('time_remaining_seconds')
+        assert got == want
+        assert type(got['auto_change_enabled']) is bool
+        if want_remaining is None:
+            assert got_remaining is None
+        else:
+            assert abs(got_remaining - want_remaining) <= 1
+
+
+def test_accounts_json_empty(make_manager):
+    assert json.loads(make_manager().get_accounts_json()) == {'success': True, 'accounts': []}
+
+
+def test_accounts_request_memory_per_account(api_server):
+    count = 2000
+    add_accounts(api_server.manager, count)
+    client = api_server.app.test_client()
+    client.get('/api/accounts')  # прогрев
+
+    tracemalloc.start()
+    try:
+        response = client.get('/api/accounts')
+        body = response.get_data()
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    assert response.status_code == 200
+    assert len(json.loads(body)['accounts']) == count
+    # Пик - это сам ответ (несколько копий строки), а не объекты на каждый аккаунт
+    assert peak < 4 * len(body) + 256 * 1024
+    # Число живых блоков не растет с числом аккаунтов
+    blocks = sum(stat.count for stat in snapshot.statistics('filename'))
+    assert blocks < count
+
+
+def test_accounts_request_reports_database_errors(api_server):
+    conn = sqlite3.connect(api_server.manager.db_path)
+    conn.execute('DROP TABLE accounts')
+    conn.commit()
+    conn.close()
+
+    response = api_server.app.test_client().get('/api/accounts')
+
+    assert response.get_json()['success'] is False
@@ -0,0 +1,71 @@
+import io
+import pstats
+import threading
+import time
+
+import pytest
+
+import diagnostics
+from conftest import ADMIN_TOKEN
+
+
+def test_profile_time_matches_wall_clock(tmp_path):
+    stop = threading.Event()
+
+    def busy():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy, name='busy-worker')
+    worker.start()
+    try:
+        started = time.monotonic()
+        profile = diagnostics.sample_profile(0.5)
+        elapsed = time.monotonic() - started
+    finally:
+        stop.set()
+        worker.join()
+
+    path = tmp_path / 'profile.pstats'
+    path.write_bytes(profile.to_pstats())
+    stats = pstats.Stats(str(path), stream=io.StringIO())
+    busy_time = next(ct for (_, _, name), (_, _, _, ct, _) in stats.stats.items() if name == 'busy')
+
+    assert abs(busy_time - elapsed) < 0.1 * elapsed
+    assert 'busy-worker;' in profile.to_collapsed()
+
+
+def test_thread_dump_names_threads():
+    names = [thread['name'] for thread in diagnostics.thread_dump()]
+    assert 'MainThread' in names
+
+
+@pytest.mark.parametrize('token', ['', 'wrong', 'pässwörd'])
+def test_admin_rejects_bad_tokens(api_server, token):
+    response = api_server.app.test_client().get('/api/admin/health', headers={'X-Admin-Token': token})
+    assert response.status_code == 403
+
+
+def test_admin_health(api_server):
+    response = api_server.app.test_client().get(
+        '/api/admin/health', headers={'X-Admin-Token': ADMIN_TOKEN}
+    )
+    body = response.get_json()
+
+    assert response.status_code == 200
+    assert body['databases'][0]['pending_rotations'] == 0
+    assert 'accounts' not in body['databases'][0]
+    assert body['caches']['in_flight'] == 0
+
+
+@pytest.mark.parametrize('seconds', ['nan', 'inf', '-inf', 'abc'])
+def test_admin_profile_rejects_bad_seconds(api_server, seconds):
+    response = api_server.app.test_client().get(
+        f'/api/admin/profile?seconds={seconds}', headers={'X-Admin-Token': ADMIN_TOKEN}
+    )
+    assert response.status_code == 400
+
+
+def test_sample_profile_rejects_nan():
+    with pytest.raises(ValueError):
+        diagnostics.sample_profile(float('nan'))
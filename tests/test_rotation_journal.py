@@ -0,0 +1,218 @@
+import sqlite3
+import threading
+
+import pytest
+
+from steam_manager import ROTATION_COMMITTED, ROTATION_IN_DOUBT, ROTATION_NOT_PENDING, ROTATION_ROLLED_BACK
+
+
+class Crash(BaseException):
+    """Имитация падения процесса: не перехватывается как Exception"""
+
+
+def journal(manager):
+    rows = []
+    for path in manager.shard_paths:
+        conn = sqlite3.connect(path)
+        rows.extend(conn.execute('SELECT account_id, encrypted_password FROM rotation_journal'))
+        conn.close()
+    return {account_id: bytes(password) for account_id, password in rows}
+
+
+def stored_password(manager, account_id):
+    return manager._get_account_secrets(account_id).password
+
+
+def restart(make_manager, manager):
+    """Новый процесс на той же БД"""
+    return make_manager(db_path=manager.db_path, shards=manager.shards)
+
+
+def test_successful_rotation_leaves_no_journal(account, fake_steam):
+    manager, account_id = account
+
+    result = manager.change_password(account_id, 'new-password')
+
+    assert result['success']
+    assert journal(manager) == {}
+    assert stored_password(manager, account_id) == 'new-password'
+    assert fake_steam.passwords['alice'] == 'new-password'
+
+
+def test_failure_before_journal_write(account, fake_steam, make_manager):
+    manager, account_id = account
+    fake_steam.login_failures.append(ConnectionError("network down"))
+
+    result = manager.change_password(account_id, 'new-password')
+
+    assert not result['success']
+    assert journal(manager) == {}
+    assert fake_steam.changes == 0
+
+    restarted = restart(make_manager, manager)
+    logins = fake_steam.logins
+    assert restarted.recover_rotations() == {}
+    assert fake_steam.logins == logins
+    assert stored_password(restarted, account_id) == 'old-password'
+
+
+def test_crash_between_steam_change_and_commit(account, fake_steam, make_manager, monkeypatch):
+    manager, account_id = account
+    def crash(*args, **kwargs):
+        raise Crash()
+
+    monkeypatch.setattr(manager, '_commit_rotation', crash)
+
+    with pytest.raises(Crash):
+        manager.change_password(account_id, 'new-password')
+
+    assert fake_steam.passwords['alice'] == 'new-password'
+    assert journal(manager) == {account_id: b'new-password'}
+    assert stored_password(manager, account_id) == 'old-password'
+
+    restarted = restart(make_manager, manager)
+    logins = fake_steam.logins
+    assert restarted.recover_rotations() == {account_id: ROTATION_COMMITTED}
+    # Одного входа с новым паролем достаточно
+    assert fake_steam.logins == logins + 1
+    assert journal(restarted) == {}
+    assert stored_password(restarted, account_id) == 'new-password'
+
+
+def test_steam_error_after_applying_change(account, fake_steam, make_manager):
+    manager, account_id = account
+    fake_steam.change_failures_after.append(TimeoutError("response lost"))
+
+    result = manager.change_password(account_id, 'new-password')
+
+    assert not result['success']
+    assert journal(manager) == {account_id: b'new-password'}
+
+    restarted = restart(make_manager, manager)
+    assert restarted.recover_rotations() == {account_id: ROTATION_COMMITTED}
+    assert journal(restarted) == {}
+    assert stored_password(restarted, account_id) == 'new-password'
+
+
+def test_steam_error_before_applying_change(account, fake_steam, make_manager):
+    manager, account_id = account
+    fake_steam.change_failures.append(TimeoutError("request lost"))
+
+    result = manager.change_password(account_id, 'new-password')
+
+    assert not result['success']
+    assert journal(manager) == {account_id: b'new-password'}
+
+    restarted = restart(make_manager, manager)
+    assert restarted.recover_rotations() == {account_id: ROTATION_ROLLED_BACK}
+    assert journal(restarted) == {}
+    assert stored_password(restarted, account_id) == 'old-password'
+    # Новый пароль отвергнут, старый подтвержден контрольным входом
+    assert fake_steam.login_log[-2:] == [('alice', 'new-password'), ('alice', 'old-password')]
+
+
+def test_network_failure_during_recovery_keeps_journal(account, fake_steam, make_manager):
+    manager, account_id = account
+    fake_steam.change_failures_after.append(TimeoutError("response lost"))
+    manager.change_password(account_id, 'new-password')
+
+    restarted = restart(make_manager, manager)
+    fake_steam.login_failures.append(ConnectionError("network down"))
+    assert restarted.recover_rotations() == {account_id: ROTATION_IN_DOUBT}
+    assert journal(restarted) == {account_id: b'new-password'}
+    assert stored_password(restarted, account_id) == 'old-password'
+
+    # Следующий проход после восстановления сети завершает смену
+    assert restarted.recover_rotations() == {account_id: ROTATION_COMMITTED}
+    assert journal(restarted) == {}
+    assert stored_password(restarted, account_id) == 'new-password'
+
+
+def test_throttled_recovery_does_not_drop_candidate(account, fake_steam, make_manager):
+    manager, account_id = account
+    fake_steam.change_failures_after.append(TimeoutError("response lost"))
+    manager.change_password(account_id, 'new-password')
+
+    restarted = restart(make_manager, manager)
+    fake_steam.throttled = True
+    assert restarted.recover_rotations() == {account_id: ROTATION_IN_DOUBT}
+    assert journal(restarted) == {account_id: b'new-password'}
+
+    fake_steam.throttled = False
+    assert restarted.recover_rotations() == {account_id: ROTATION_COMMITTED}
+    assert stored_password(restarted, account_id) == 'new-password'
+
+
+def test_pending_rotation_blocks_new_rotation_while_in_doubt(account, fake_steam):
+    manager, account_id = account
+    fake_steam.change_failures_after.append(TimeoutError("response lost"))
+    manager.change_password(account_id, 'new-password')
+
+    fake_steam.throttled = True
+    result = manager.change_password(account_id, 'newer-password')
+
+    assert not result['success']
+    assert fake_steam.changes == 1
+    assert journal(manager) == {account_id: b'new-password'}
+
+
+def test_batched_concurrent_recovery(make_manager, fake_steam):
+    manager = make_manager(shards=4)
+    ids = {}
+    for i in range(40):
+        login = f'user{i}'
+        manager.add_account(login, 'old', {'shared_secret': 'x'})
+        fake_steam.passwords[login] = 'old'
+    for acc in manager.get_accounts():
+        ids[acc.login] = acc.id
+        # Половина смен дошла до Steam, половина - нет
+        if int(acc.login[4:]) % 2 == 0:
+            fake_steam.passwords[acc.login] = 'new'
+        manager._journal_rotation(acc.id, b'new')
+    fake_steam.latency = 0.05
+
+    restarted = make_manager(db_path=manager.db_path, shards=4)
+    results = restarted.recover_rotations(max_workers=8)
+
+    assert len(results) == 40
+    for login, account_id in ids.items():
+        expected = ROTATION_COMMITTED if int(login[4:]) % 2 == 0 else ROTATION_ROLLED_BACK
+        assert results[account_id] == expected
+        assert stored_password(restarted, account_id) == fake_steam.passwords[login]
+    assert journal(restarted) == {}
+    # Один вход на подтвержденную смену, два - на откат
+    assert fake_steam.logins == 20 + 40
+
+
+def test_recovery_waits_for_rotation_in_flight(account, fake_steam, monkeypatch):
+    manager, account_id = account
+    started, release = threading.Event(), threading.Event()
+    change = fake_steam.change_password
+
+    def gated_change(username, new_password):
+        started.set()
+        release.wait(timeout=10)
+        change(username, new_password)
+
+    monkeypatch.setattr(fake_steam, 'change_password', gated_change)
+    rotation = threading.Thread(target=manager.change_password, args=(account_id, 'new-password'))
+    rotation.start()
+    assert started.wait(timeout=10)
+    # Запись журнала уже есть, смена в Steam еще не применена
+    assert account_id in journal(manager)
+
+    results = {}
+    recovery = threading.Thread(target=lambda: results.update(manager.recover_rotations()))
+    recovery.start()
+    recovery.join(timeout=0.3)
+    assert recovery.is_alive()
+
+    release.set()
+    rotation.join()
+    recovery.join()
+
+    assert results == {account_id: ROTATION_NOT_PENDING}
+    assert fake_steam.logins == 1
+    assert journal(manager) == {}
+    assert stored_password(manager, account_id) == 'new-password'
+    assert fake_steam.passwords['alice'] == 'new-password'
@@ -0,0 +1,77 @@
+import importlib
+import sys
+import time
+
+import pytest
+
+pytest.importorskip('flask')
+
+
+@pytest.fixture
+def web_interface(workdir):
+    sys.modules.pop('web_interface', None)
+    module = importlib.import_module('web_interface')
+    yield module
+    module.manager.stop_scheduler()
+    sys.modules.pop('web_interface', None)
+
+
+def wait_ready(client, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get('/api/ready').status_code == 200:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_web_interface_serves_readiness(web_interface):
+    client = web_interface.app.test_client()
+
+    assert not web_interface.manager.ready.is_set()
+    assert client.get('/api/health').status_code == 200
+    # Первый запрос запускает загрузку расписания и без serve()
+    assert wait_ready(client)
+
+
+def test_scheduler_starts_without_requests(workdir, monkeypatch):
+    import server
+    monkeypatch.setattr(server, 'SCHEDULER_START_DELAY', 0.2)
+    sys.modules.pop('web_interface', None)
+    module = importlib.import_module('web_interface')
+    try:
+        assert not module.manager.ready.is_set()
+        # Ни serve(), ни запросов: планировщик все равно запускается
+        assert module.manager.ready.wait(timeout=10)
+    finally:
+        module.manager.stop_scheduler()
+        sys.modules.pop('web_interface', None)
+
+
+def test_scheduled_rotations_armed_without_serve(make_manager, workdir):
+    from datetime import datetime, timedelta
+    from flask import Flask
+    from server import init_app
+
+    manager = make_manager()
+    manager.add_account('alice', 'pw', {'shared_secret': 'x'})
+    account_id = manager.get_accounts()[0].id
+    conn = __import__('sqlite3').connect(manager.db_path)
+    conn.execute(
+        'UPDATE accounts SET auto_change_enabled = 1, next_scheduled_change = ? WHERE id = ?',
+        ((datetime.now() + timedelta(hours=1)).isoformat(), account_id)
+    )
+    conn.commit()
+    conn.close()
+
+    app = Flask(__name__)
+    init_app(app, manager)
+    assert wait_ready(app.test_client())
+    assert account_id in manager.timers
+
+
+def test_server_module_has_no_import_side_effects(workdir):
+    sys.modules.pop('server', None)
+    importlib.import_module('server')
+
+    assert not (workdir / 'steam_accounts.db').exists()
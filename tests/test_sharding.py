@@ -0,0 +1,158 @@
+import os
+import sqlite3
+
+import pytest
+
+import steam_manager
+from steam_manager import SHARD_SLOTS, login_slot, reshard
+
+
+def add_accounts(manager, count, prefix='user'):
+    for i in range(count):
+        assert manager.add_account(f'{prefix}{i}', f'pw{i}', {'shared_secret': 'x'})
+
+
+def test_sharded_routing_by_id_and_login(make_manager, workdir):
+    manager = make_manager(shards=4)
+    add_accounts(manager, 40)
+
+    accounts = manager.get_accounts()
+    assert len(accounts) == 40
+    for acc in accounts:
+        assert acc.id % SHARD_SLOTS == login_slot(acc.login)
+        assert manager._db_for_id(acc.id) == manager._db_for_login(acc.login)
+        assert manager._get_account_secrets(acc.id).login == acc.login
+    assert not (workdir / 'steam_accounts.db').exists()
+    assert sum(1 for path in manager.shard_paths if os.path.exists(path)) == 4
+
+
+def test_reshard_round_trip(make_manager, workdir):
+    db_path = str(workdir / 'steam_accounts.db')
+    add_accounts(make_manager(), 30)
+
+    assert reshard(db_path, 1, 4) == 30
+    sharded = make_manager(shards=4)
+    logins = {acc.login for acc in sharded.get_accounts()}
+    assert len(logins) == 30
+    for acc in sharded.get_accounts():
+        assert sharded._get_account_secrets(acc.id).login == acc.login
+    ids = {acc.login: acc.id for acc in sharded.get_accounts()}
+
+    # Id, закодированные слотом, переживают решардинг
+    reshard(db_path, 4, 3)
+    assert {acc.login: acc.id for acc in make_manager(shards=3).get_accounts()} == ids
+
+    reshard(db_path, 3, 1)
+    assert sorted(os.listdir(workdir)) == ['steam_accounts.db']
+    assert {acc.login for acc in make_manager().get_accounts()} == logins
+
+
+def test_sharded_mode_refuses_unsharded_database(make_manager):
+    add_accounts(make_manager(), 2)
+
+    with pytest.raises(RuntimeError, match='reshard.py'):
+        make_manager(shards=4)
+
+
+def test_sharded_mode_allows_empty_database(make_manager):
+    make_manager()
+    assert make_manager(shards=2).get_accounts() == []
+
+
+class Crash(BaseException):
+    """Имитация падения процесса"""
+
+
+def accounts_by_file(db_path):
+    counts = {}
+    for path in steam_manager.existing_db_files(db_path):
+        conn = sqlite3.connect(path)
+        counts[os.path.basename(path)] = conn.execute('SELECT COUNT(*) FROM accounts').fetchone()[0]
+        conn.close()
+    return counts
+
+
+def crash_on(monkeypatch, name, call, match=lambda *args: True):
+    """Падение процесса на call-м подходящем вызове os.<name>"""
+    original = getattr(steam_manager.os, name)
+    calls = []
+
+    def wrapper(*args):
+        if match(*args):
+            calls.append(args)
+            if len(calls) == call:
+                raise Crash()
+        return original(*args)
+
+    monkeypatch.setattr(steam_manager.os, name, wrapper)
+
+
+@pytest.mark.parametrize('old_shards, new_shards, name, call', [
+    (4, 3, 'replace', 2),
+    (3, 4, 'replace', 4),
+    (1, 2, 'remove', 1),
+])
+def test_reshard_crash_then_retry(make_manager, workdir, monkeypatch, old_shards, new_shards, name, call):
+    db_path = str(workdir / 'steam_accounts.db')
+    add_accounts(make_manager(shards=old_shards), 40)
+    before = {acc.login: acc.id for acc in make_manager(shards=old_shards).get_accounts()}
+    files_before = accounts_by_file(db_path)
+
+    # Падение во время подмены файлов шардов
+    crash_on(monkeypatch, name, call, match=lambda src, *rest: src.endswith(('.reshard', '.db')))
+    with pytest.raises(Crash):
+        reshard(db_path, old_shards, new_shards)
+    monkeypatch.undo()
+
+    assert os.path.exists(steam_manager.reshard_state_path(db_path))
+    with pytest.raises(RuntimeError, match='reshard.py'):
+        make_manager(shards=new_shards)
+
+    # Повторный запуск возвращает исходные файлы и выполняет решардинг заново
+    assert reshard(db_path, old_shards, new_shards) == 40
+    after = {acc.login: acc.id for acc in make_manager(shards=new_shards).get_accounts()}
+    if old_shards > 1:
+        assert after == before
+    else:
+        assert set(after) == set(before)
+    assert sum(accounts_by_file(db_path).values()) == sum(files_before.values()) == 40
+    assert sorted(os.listdir(workdir)) == sorted(
+        os.path.basename(path) for path in steam_manager.shard_paths(db_path, new_shards)
+    )
+
+
+def test_reshard_crash_before_state_file_keeps_originals(make_manager, workdir, monkeypatch):
+    db_path = str(workdir / 'steam_accounts.db')
+    add_accounts(make_manager(shards=4), 20)
+    files_before = accounts_by_file(db_path)
+
+    crash_on(monkeypatch, 'link', 3)
+    with pytest.raises(Crash):
+        reshard(db_path, 4, 3)
+    monkeypatch.undo()
+
+    assert not os.path.exists(steam_manager.reshard_state_path(db_path))
+    assert accounts_by_file(db_path) == files_before
+    assert reshard(db_path, 4, 3) == 20
+    assert not any(name.endswith(('.bak', '.reshard')) for name in os.listdir(workdir))
+
+
+def test_reshard_refuses_accounts_outside_old_shards(make_manager, workdir):
+    db_path = str(workdir / 'steam_accounts.db')
+    add_accounts(make_manager(shards=4), 20)
+    files_before = accounts_by_file(db_path)
+
+    # Неверно указано текущее число шардов: shard3 был бы потерян
+    with pytest.raises(RuntimeError, match='shard3'):
+        reshard(db_path, 3, 2)
+    # Целевой шард вне old_shards уже содержит аккаунты
+    with pytest.raises(RuntimeError, match='shard'):
+        reshard(db_path, 1, 4)
+    assert accounts_by_file(db_path) == files_before
+
+
+def test_unsharded_mode_refuses_shard_files(make_manager):
+    add_accounts(make_manager(shards=4), 2)
+
+    with pytest.raises(RuntimeError, match='reshard.py 4 1'):
+        make_manager()
@@ -0,0 +1,110 @@
+import threading
+import time
+
+THREADS = 32
+
+
+def run_concurrently(count, fn):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        barrier.wait()
+        results[i] = fn(i)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_rotations_and_codes_share_one_call(account, fake_steam, monkeypatch):
+    manager, account_id = account
+    fake_steam.latency = 0.3
+
+    code_calls = []
+    generate = manager._generate_guard_code
+
+    def slow_generate(account_id):
+        code_calls.append(account_id)
+        time.sleep(0.3)
+        return generate(account_id)
+
+    monkeypatch.setattr(manager, '_generate_guard_code', slow_generate)
+
+    def call(i):
+        if i % 2:
+            return manager.generate_guard_code(account_id)
+        return manager.change_password(account_id)
+
+    results = run_concurrently(THREADS, call)
+    rotations = [r for r in results if isinstance(r, dict)]
+    codes = [r for r in results if not isinstance(r, dict)]
+
+    assert fake_steam.logins == 1
+    assert fake_steam.changes == 1
+    assert len(code_calls) == 1
+    assert len(rotations) == len(codes) == THREADS // 2
+    assert all(r is rotations[0] for r in rotations)
+    assert rotations[0]['success']
+    assert set(codes) == {'CODE-x'}
+    new_password = rotations[0]['new_password']
+    assert fake_steam.passwords['alice'] == new_password
+    assert manager._get_account_secrets(account_id).password == new_password
+    assert len(manager._flights) == 0
+
+
+def test_different_password_waits_for_running_rotation(account, fake_steam, monkeypatch):
+    manager, account_id = account
+    fake_steam.latency = 0.2
+    events = []
+    login, change = fake_steam.login, fake_steam.change_password
+
+    def traced_login(username, password, twofactor_code):
+        events.append(('login start', password))
+        login(username, password, twofactor_code)
+
+    def traced_change(username, new_password):
+        change(username, new_password)
+        events.append(('change done', new_password))
+
+    monkeypatch.setattr(fake_steam, 'login', traced_login)
+    monkeypatch.setattr(fake_steam, 'change_password', traced_change)
+
+    first = threading.Thread(target=manager.change_password, args=(account_id, 'first'))
+    first.start()
+    while not events:
+        time.sleep(0.005)
+    results = run_concurrently(
+        6, lambda i: manager.change_password(account_id, 'second')
+    )
+    first.join()
+
+    assert events == [
+        ('login start', 'old-password'),
+        ('change done', 'first'),
+        ('login start', 'first'),
+        ('change done', 'second'),
+    ]
+    assert all(r is results[0] and r['success'] for r in results)
+    assert manager._get_account_secrets(account_id).password == 'second'
+    assert len(manager._flights) == 0
+
+
+def test_failed_call_is_shared_and_cleared(account, fake_steam):
+    manager, account_id = account
+    fake_steam.latency = 0.2
+    fake_steam.login_failures.append(ConnectionError("network down"))
+
+    results = run_concurrently(THREADS, lambda i: manager.change_password(account_id, 'new-password'))
+
+    assert fake_steam.logins == 1
+    assert all(not r['success'] for r in results)
+    assert len(manager._flights) == 0
+
+    # После ошибки следующий вызов выполняется заново
+    fake_steam.latency = 0
+    assert manager.change_password(account_id, 'new-password')['success']
+    assert fake_steam.logins == 2
@@ -1,12 +1,19 @@
 # web_interface.py
 from flask import Flask, render_template, request, jsonify
 import json
+import os
 import threading
 import time
 from steam_manager import SteamAccountManager
+from server import init_app
 
 app = Flask(__name__)
-manager = SteamAccountManager()
+# Расписание загружается в фоне после запуска сервера (см. server.init_app / serve)
+# STEAM_DB_SHARDS > 1 включает хранение аккаунтов в нескольких файлах БД
+manager = SteamAccountManager(
+    autostart_scheduler=False, shards=int(os.environ.get('STEAM_DB_SHARDS', 1))
+)
+init_app(app, manager)
 
 @app.route('/')
 def index():